@@ -7,6 +7,9 @@ from dotenv import load_dotenv
 from datetime import datetime
 import base64
 
+from helpers import format_time
+from model_registry import ModelRegistry, DEFAULT_RACE, DEFAULT_DISTANCE
+
 try:
     from langfuse.decorators import observe
     from langfuse.openai import OpenAI as LangfuseOpenAI
@@ -376,14 +379,21 @@ def log_to_langfuse(function_name, input_data, output_data, metadata=None):
         print(f"Available methods: {available[:10]}")
         return None
 
-def load_model():
-    """Załaduj wytrenowany model regresji PyCaret"""
+@st.cache_resource
+def get_model_registry():
+    """Wspólny dla wszystkich sesji rejestr modeli (model/registry.json lub model domyślny)"""
+    return ModelRegistry.from_file()
+
+
+def load_model(race=DEFAULT_RACE, distance=DEFAULT_DISTANCE, variant=None):
+    """Załaduj wytrenowany model regresji PyCaret z rejestru (leniwie, z limitem pamięci)"""
     try:
-        # Import PyCaret functions
-        from pycaret.regression import load_model as pycaret_load_model, predict_model as pycaret_predict_model
-        
-        # Załaduj model PyCaret
-        model = pycaret_load_model('model/app_zad_dom_9_regressor')
+        # Wariant A/B przypisany na stałe do sesji użytkownika
+        routing_key = st.session_state.setdefault("_model_routing_key", os.urandom(8).hex())
+        spec, model = get_model_registry().get_for(race, distance, variant, routing_key)
+        # Zapamiętaj, który model/wariant obsłużył sesję — do wyświetlenia i logów Langfuse
+        st.session_state["model_name"] = spec.name
+        st.session_state["model_variant"] = spec.variant
         return model
     except Exception as e:
         st.error(f"Błąd podczas ładowania modelu: {e}")
@@ -484,7 +494,7 @@ def infer_gender_from_name(name):
         st.error(f"Błąd podczas rozpoznawania płci: {e}")
         return None
 
-def predict_half_marathon_time(model, gender, age, time_5k):
+def predict_half_marathon_time(model, gender, age, time_5k, model_name=None, model_variant=None):
     """Przewiduj czas półmaratonu na podstawie danych użytkownika"""
     try:
         from pycaret.regression import predict_model as pycaret_predict_model
@@ -506,6 +516,13 @@ def predict_half_marathon_time(model, gender, age, time_5k):
         # Dokonaj predykcji używając PyCaret
         prediction_df = pycaret_predict_model(model, data=input_data)
         prediction = prediction_df['prediction_label'].iloc[0]
+
+        log_to_langfuse(
+            "predict_half_marathon_time",
+            input_data={"gender": gender, "age": age, "time_5k_seconds": time_5k},
+            output_data={"predicted_seconds": float(prediction)},
+            metadata={"model_name": model_name, "model_variant": model_variant},
+        )
         
         return prediction
         
@@ -513,13 +530,6 @@ def predict_half_marathon_time(model, gender, age, time_5k):
         st.error(f"Błąd podczas predykcji: {e}")
         return None
 
-def format_time(seconds):
-    """Formatuj czas z sekund na format HH:MM:SS"""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    seconds = int(seconds % 60)
-    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-
 def main():
     if "demo_mode" not in st.session_state:
         st.session_state.demo_mode = False
@@ -550,6 +560,10 @@ def main():
     model = load_model()
     if model is None:
         st.stop()
+    st.sidebar.caption(
+        f"Model: **{st.session_state.get('model_name')}** "
+        f"(wariant: {st.session_state.get('model_variant')})"
+    )
 
     if st.session_state.get("demo_mode"):
         st.warning(
@@ -680,7 +694,14 @@ def main():
             time_5k_seconds = time_5k * 60
             
             # Predykcja
-            predicted_time = predict_half_marathon_time(model, gender, age, time_5k_seconds)
+            predicted_time = predict_half_marathon_time(
+                model,
+                gender,
+                age,
+                time_5k_seconds,
+                model_name=st.session_state.get("model_name"),
+                model_variant=st.session_state.get("model_variant"),
+            )
             
             if predicted_time is not None:
                 # Główny wynik
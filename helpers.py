@@ -0,0 +1,42 @@
+"""Drobne funkcje pomocnicze współdzielone przez aplikację, API i narzędzia."""
+import os
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+
+def format_time(seconds):
+    """Formatuj czas z sekund na format HH:MM:SS"""
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    seconds = int(seconds % 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def percentile(values, pct):
+    """Percentyl z interpolacją liniową (pct w zakresie 0-100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def get_rss_mb(pid=None):
+    """Aktualna pamięć RSS procesu `pid` (domyślnie bieżącego) w MB; bez psutil — z /proc (Linux) lub None."""
+    pid = os.getpid() if pid is None else pid
+    if PSUTIL_AVAILABLE:
+        return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
@@ -0,0 +1,416 @@
+"""
+Test obciążeniowy aplikacji Streamlit (app.py).
+
+Uruchamia prawdziwy serwer `streamlit run app.py` (z tymi samymi flagami co
+w `.do/app.yaml`) oraz lokalny, udawany endpoint OpenAI, na który aplikacja
+jest kierowana przez zmienną `OPENAI_BASE_URL`. Każda symulowana sesja to
+osobny proces łączący się z serwerem po websockecie (`/_stcore/stream`),
+tak jak przeglądarka: pierwsze wyświetlenie strony -> wysłanie formularza ->
+analiza AI -> predykcja.
+
+Współbieżność jest zwiększana stopniowo (ramp), a dla każdego poziomu
+raportowana jest przepustowość, percentyle opóźnień, odsetek błędów
+oraz pamięć RSS procesu serwera — na tej podstawie dobieramy
+`instance_size_slug` i `instance_count` w `.do/app.yaml`.
+
+Przykład:
+    python load_test.py --levels 1,2,4,8,16 --sessions-per-level 20 --llm-latency-ms 800
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import get_context
+
+from helpers import get_rss_mb, percentile
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_FILE = os.path.join(APP_DIR, "app.py")
+
+FAKE_API_KEY = "sk-load-test"
+RESULT_MARKER = "Przewidywany czas półmaratonu"
+USER_TEXT_PREFIX = "Tekst użytkownika: "
+GENDER_QUESTION_PREFIX = "Jaką płeć ma osoba o imieniu: "
+
+# Tekst wpisywany w formularz i dane, które "LLM" z niego wyciąga.
+# Ostatni przykład nie ma płci — aplikacja dopyta o nią osobnym wywołaniem.
+SAMPLE_SESSIONS = (
+    ("Jestem Anna, mam 28 lat i biegam 5 km w 24 minuty",
+     {"name": "Anna", "age": 28, "birth_year": None, "gender": "K", "time_5k_minutes": 24.0}),
+    ("Marek, 35 lat, czas na 5km: 22:45",
+     {"name": "Marek", "age": 35, "birth_year": None, "gender": "M", "time_5k_minutes": 22.75}),
+    ("Nazywam się Kasia, urodziłam się w 1990 roku, biegam 5 km w 26.5 minuty",
+     {"name": "Kasia", "age": None, "birth_year": 1990, "gender": "K", "time_5k_minutes": 26.5}),
+    ("Janek 75 25",
+     {"name": "Janek", "age": 75, "birth_year": None, "gender": None, "time_5k_minutes": 25.0}),
+)
+NAME_GENDERS = {"Anna": "K", "Marek": "M", "Kasia": "K", "Janek": "M"}
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    """Udaje API OpenAI: `GET /v1/models` (walidacja klucza) i `POST /v1/chat/completions`."""
+
+    latency_s = 0.0
+    extractions = {text: data for text, data in SAMPLE_SESSIONS}
+
+    def _send_json(self, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._send_json({
+            "object": "list",
+            "data": [{"id": "gpt-4", "object": "model", "created": 0, "owned_by": "load-test"}],
+        })
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        user_content = request.get("messages", [{}])[-1].get("content", "")
+        self._send_json({
+            "id": "chatcmpl-load-test",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.answer(user_content)},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    def answer(self, user_content):
+        """Odpowiedź zależna od promptu — dane wyciągnięte z konkretnego tekstu lub płeć z imienia."""
+        if user_content.startswith(GENDER_QUESTION_PREFIX):
+            name = user_content[len(GENDER_QUESTION_PREFIX):].rstrip("?").strip()
+            return NAME_GENDERS.get(name, "NIEZNANA")
+        text = user_content[len(USER_TEXT_PREFIX):] if user_content.startswith(USER_TEXT_PREFIX) else user_content
+        data = self.extractions.get(text.strip(), dict.fromkeys(
+            ("name", "age", "birth_year", "gender", "time_5k_minutes")))
+        return json.dumps(data, ensure_ascii=False)
+
+
+def start_mock_openai(latency_s):
+    """Serwer udający OpenAI w wątku tła; zwraca (server, base_url)."""
+    handler = type("ConfiguredMockOpenAIHandler", (MockOpenAIHandler,), {"latency_s": latency_s})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.request_queue_size = 256
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_streamlit(port, openai_base_url, startup_timeout_s=120):
+    """Uruchom `streamlit run app.py` jak w `.do/app.yaml` i poczekaj na /_stcore/health."""
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY=FAKE_API_KEY,
+        OPENAI_BASE_URL=openai_base_url,
+        # Puste (a nie usunięte) — load_dotenv nie nadpisze ich wartościami z .env
+        LANGFUSE_SECRET_KEY="",
+        LANGFUSE_PUBLIC_KEY="",
+    )
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "streamlit", "run", APP_FILE,
+            f"--server.port={port}", "--server.address=127.0.0.1",
+            "--server.enableCORS=false", "--server.enableXsrfProtection=false",
+            "--server.headless=true", "--browser.gatherUsageStats=false",
+        ],
+        cwd=APP_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + startup_timeout_s
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Serwer Streamlit zakończył się z kodem {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as resp:
+                if resp.status == 200:
+                    return process
+        except OSError:
+            time.sleep(0.5)
+    process.kill()
+    raise RuntimeError("Serwer Streamlit nie odpowiedział na /_stcore/health")
+
+
+def connect_to_streamlit(port, timeout_s):
+    """Połączenie websocket jak z przeglądarki (do użycia w `with`)."""
+    from websockets.sync.client import connect
+
+    return connect(
+        f"ws://127.0.0.1:{port}/_stcore/stream",
+        subprotocols=["streamlit"],
+        origin=f"http://127.0.0.1:{port}",
+        max_size=None,
+        open_timeout=timeout_s,
+    )
+
+
+class StreamlitSession:
+    """Minimalny klient protokołu Streamlit (protobuf po websockecie) — jedna sesja przeglądarki."""
+
+    def __init__(self, ws, timeout_s):
+        self.ws = ws
+        self.timeout_s = timeout_s
+        self.page_script_hash = ""
+
+    def rerun(self, widget_states=()):
+        """Wyślij rerun_script i zbierz elementy aż do końca uruchomienia skryptu."""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        back_msg = BackMsg()
+        back_msg.rerun_script.query_string = ""
+        back_msg.rerun_script.page_script_hash = self.page_script_hash
+        back_msg.rerun_script.widget_states.widgets.extend(widget_states)
+        self.ws.send(back_msg.SerializeToString())
+
+        elements = []
+        deadline = time.monotonic() + self.timeout_s
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Przekroczono limit czasu uruchomienia skryptu")
+            msg = ForwardMsg()
+            msg.ParseFromString(self.ws.recv(timeout=remaining))
+            msg_type = msg.WhichOneof("type")
+            if msg_type == "new_session":
+                self.page_script_hash = msg.new_session.page_script_hash
+            elif msg_type == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                elements.append(msg.delta.new_element)
+            elif msg_type == "script_finished":
+                if msg.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    # st.rerun() — serwer sam uruchamia skrypt ponownie
+                    elements = []
+                    continue
+                if msg.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError("Błąd kompilacji app.py")
+                return elements
+
+
+def find_elements(elements, element_type):
+    return [getattr(e, element_type) for e in elements if e.WhichOneof("type") == element_type]
+
+
+def run_session(port, session_no, timeout_s):
+    """
+    Jedna symulowana sesja (w osobnym procesie): pierwsze wyświetlenie strony + wysłanie formularza.
+    Zwraca słownik z czasami poszczególnych uruchomień skryptu i ewentualnym błędem.
+    """
+    from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+    run_latencies = []
+    started = time.perf_counter()
+    try:
+        with connect_to_streamlit(port, timeout_s) as ws:
+            session = StreamlitSession(ws, timeout_s)
+            t0 = time.perf_counter()
+            elements = session.rerun()
+            run_latencies.append(time.perf_counter() - t0)
+            exceptions = find_elements(elements, "exception")
+            if exceptions:
+                raise RuntimeError(f"Wyjątek przy pierwszym renderze: {exceptions[0].message}")
+
+            text_areas = find_elements(elements, "text_area")
+            submitters = [b for b in find_elements(elements, "button") if b.is_form_submitter]
+            if not text_areas or not submitters:
+                raise RuntimeError("Nie znaleziono formularza — czy walidacja klucza przeszła?")
+
+            text, _expected = SAMPLE_SESSIONS[session_no % len(SAMPLE_SESSIONS)]
+            widget_states = [
+                WidgetState(id=text_areas[0].id, string_value=text),
+                WidgetState(id=submitters[0].id, trigger_value=True),
+            ]
+            t0 = time.perf_counter()
+            elements = session.rerun(widget_states)
+            run_latencies.append(time.perf_counter() - t0)
+            exceptions = find_elements(elements, "exception")
+            if exceptions:
+                raise RuntimeError(f"Wyjątek po wysłaniu formularza: {exceptions[0].message}")
+            if not any(RESULT_MARKER in md.body for md in find_elements(elements, "markdown")):
+                alerts = "; ".join(a.body for a in find_elements(elements, "alert")
+                                   if "❌" in a.body or "Błąd" in a.body)
+                raise RuntimeError(alerts or "brak wyniku predykcji")
+        error = None
+    except Exception as e:
+        error = str(e).strip() or repr(e)
+
+    return {
+        "session_latency": time.perf_counter() - started,
+        "run_latencies": run_latencies,
+        "error": error,
+    }
+
+
+def _warm_up_worker():
+    # Import protobufów i websockets przed pomiarem, żeby nie liczyć go do opóźnień
+    import websockets.sync.client  # noqa: F401
+    from streamlit.proto import BackMsg_pb2, ForwardMsg_pb2, WidgetStates_pb2  # noqa: F401
+    return os.getpid()
+
+
+def run_level(port, server_pid, concurrency, sessions, timeout_s):
+    """Uruchom `sessions` sesji, każda w osobnym procesie, maksymalnie `concurrency` jednocześnie."""
+    with ProcessPoolExecutor(max_workers=concurrency, mp_context=get_context("spawn")) as pool:
+        for future in [pool.submit(_warm_up_worker) for _ in range(concurrency)]:
+            future.result()
+
+        peak_rss = [get_rss_mb(server_pid) or 0.0]
+        stop = threading.Event()
+
+        def sample_rss():
+            while not stop.wait(0.2):
+                peak_rss.append(get_rss_mb(server_pid) or 0.0)
+
+        sampler = threading.Thread(target=sample_rss, daemon=True)
+        sampler.start()
+        started = time.perf_counter()
+        futures = [pool.submit(run_session, port, n, timeout_s) for n in range(sessions)]
+        results = [f.result() for f in futures]
+        elapsed = time.perf_counter() - started
+        stop.set()
+        sampler.join()
+        peak_rss.append(get_rss_mb(server_pid) or 0.0)
+
+    ok = [r for r in results if r["error"] is None]
+    session_latencies = [r["session_latency"] for r in ok]
+    run_latencies = [lat for r in results for lat in r["run_latencies"]]
+    errors = [r["error"] for r in results if r["error"] is not None]
+
+    return {
+        "concurrency": concurrency,
+        "sessions": sessions,
+        "elapsed_s": elapsed,
+        "throughput_sessions_per_s": len(ok) / elapsed if elapsed else 0.0,
+        "throughput_runs_per_s": len(run_latencies) / elapsed if elapsed else 0.0,
+        "error_rate": len(errors) / sessions if sessions else 0.0,
+        "session_p50_s": percentile(session_latencies, 50),
+        "session_p90_s": percentile(session_latencies, 90),
+        "session_p99_s": percentile(session_latencies, 99),
+        "run_p50_s": percentile(run_latencies, 50),
+        "run_p95_s": percentile(run_latencies, 95),
+        "run_mean_s": statistics.fmean(run_latencies) if run_latencies else None,
+        "rss_peak_mb": max(peak_rss),
+        "errors_sample": sorted(set(errors))[:5],
+    }
+
+
+def format_report(levels):
+    """Tabela tekstowa z wynikami wszystkich poziomów współbieżności."""
+    def fmt(value, spec=".3f"):
+        return "-" if value is None else format(value, spec)
+
+    header = (
+        f"{'conc':>5} {'sess':>5} {'sess/s':>8} {'err%':>6} "
+        f"{'p50[s]':>8} {'p90[s]':>8} {'p99[s]':>8} {'run p95':>8} {'RSS[MB]':>8}"
+    )
+    lines = [header, "-" * len(header)]
+    for lvl in levels:
+        lines.append(
+            f"{lvl['concurrency']:>5} {lvl['sessions']:>5} "
+            f"{fmt(lvl['throughput_sessions_per_s'], '.2f'):>8} "
+            f"{fmt(lvl['error_rate'] * 100, '.1f'):>6} "
+            f"{fmt(lvl['session_p50_s']):>8} {fmt(lvl['session_p90_s']):>8} "
+            f"{fmt(lvl['session_p99_s']):>8} {fmt(lvl['run_p95_s']):>8} "
+            f"{fmt(lvl['rss_peak_mb'], '.0f'):>8}"
+        )
+        for err in lvl["errors_sample"]:
+            lines.append(f"      ❌ {err}")
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Test obciążeniowy aplikacji Streamlit (app.py)")
+    parser.add_argument("--levels", default="1,2,4,8,16",
+                        help="Kolejne poziomy współbieżności, np. 1,2,4,8")
+    parser.add_argument("--sessions-per-level", type=int, default=20,
+                        help="Liczba sesji uruchamianych na każdym poziomie")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0,
+                        help="Sztuczne opóźnienie mocka LLM (symulacja czasu odpowiedzi GPT-4)")
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="Limit czasu jednego uruchomienia skryptu [s]")
+    parser.add_argument("--max-error-rate", type=float, default=0.05,
+                        help="Przerwij ramp, gdy odsetek błędów przekroczy ten próg")
+    parser.add_argument("--port", type=int, default=None,
+                        help="Port serwera Streamlit (domyślnie wolny port)")
+    parser.add_argument("--json", dest="json_path", default=None,
+                        help="Zapisz wyniki do pliku JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    levels = [int(x) for x in args.levels.split(",") if x.strip()]
+
+    mock_server, openai_base_url = start_mock_openai(args.llm_latency_ms / 1000)
+    port = args.port or free_port()
+    print(f"🔍 Uruchamianie streamlit run app.py na porcie {port} (mock OpenAI: {openai_base_url})...")
+    server = start_streamlit(port, openai_base_url)
+
+    results = []
+    try:
+        print(f"🔍 RSS serwera po starcie: {get_rss_mb(server.pid) or 0:.0f} MB")
+        # Pierwsza sesja ładuje model — zimny start raportujemy osobno
+        cold = run_session(port, 0, args.timeout)
+        if cold["error"]:
+            print(f"❌ Sesja rozgrzewająca nie powiodła się: {cold['error']}")
+            return 1
+        print(f"🔍 Zimny start (pierwsza sesja): {cold['session_latency']:.2f} s, "
+              f"RSS: {get_rss_mb(server.pid) or 0:.0f} MB")
+
+        for concurrency in levels:
+            print(f"▶ Współbieżność {concurrency}, sesji: {args.sessions_per_level}...")
+            level = run_level(port, server.pid, concurrency, args.sessions_per_level, args.timeout)
+            results.append(level)
+            print(format_report([level]).splitlines()[2])
+            if level["error_rate"] > args.max_error_rate:
+                print(f"⚠️ Odsetek błędów {level['error_rate']:.1%} > {args.max_error_rate:.1%} — koniec rampy")
+                break
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        mock_server.shutdown()
+
+    print()
+    print(format_report(results))
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"cold_start": cold, "levels": results}, f, indent=2, ensure_ascii=False)
+        print(f"✅ Wyniki zapisane do {args.json_path}")
+
+    return 0 if results and results[-1]["error_rate"] <= args.max_error_rate else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
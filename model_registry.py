@@ -0,0 +1,246 @@
+"""
+Rejestr wielu modeli z leniwym ładowaniem i limitem pamięci (LRU).
+
+Modele (różne biegi, lata, dystanse, warianty A/B) są opisane w pliku
+`model/registry.json`, a ładowane dopiero przy pierwszym użyciu. Łączny
+rozmiar załadowanych modeli nie przekracza `max_memory_mb`
+(`MODEL_CACHE_MAX_MB`) — po przekroczeniu usuwane są najdawniej używane modele.
+
+Rozmiar modelu to przyrost RSS procesu zmierzony podczas ładowania (potok
+PyCaret zajmuje w pamięci kilka razy więcej niż plik .pkl), chyba że w
+`registry.json` podano `size_mb`. Bez psutil i poza Linuksem RSS nie jest
+dostępny — wtedy jedyną miarą jest rozmiar pliku i należy podać `size_mb`.
+Przy kolejnych ładowaniach tego samego modelu zapamiętywany jest największy pomiar.
+
+Model większy niż `max_memory_mb` nie jest odrzucany: usuwane są wszystkie
+pozostałe modele, on sam zostaje załadowany, a na stdout trafia ostrzeżenie
+(licznik `stats["oversized"]`). Limit jest wtedy przekroczony, dopóki ten
+model nie zostanie usunięty przez kolejne ładowanie — należy zwiększyć
+`MODEL_CACHE_MAX_MB`.
+
+Format `model/registry.json`:
+    {
+        "models": [
+            {"name": "wroclaw_half_v1", "path": "model/app_zad_dom_9_regressor",
+             "race": "wroclaw_half", "distance": "half", "variant": "default"},
+            {"name": "wroclaw_half_v2", "path": "model/wroclaw_half_v2",
+             "race": "wroclaw_half", "distance": "half", "variant": "B", "weight": 0.1}
+        ]
+    }
+"""
+import gc
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from helpers import get_rss_mb
+
+DEFAULT_REGISTRY_FILE = os.path.join("model", "registry.json")
+DEFAULT_MAX_MEMORY_MB = float(os.getenv("MODEL_CACHE_MAX_MB", "512"))
+DEFAULT_RACE = "wroclaw_half"
+DEFAULT_DISTANCE = "half"
+DEFAULT_VARIANT = "default"
+
+DEFAULT_MODELS = [
+    {
+        "name": "app_zad_dom_9_regressor",
+        "path": "model/app_zad_dom_9_regressor",
+        "race": DEFAULT_RACE,
+        "distance": DEFAULT_DISTANCE,
+        "variant": DEFAULT_VARIANT,
+    },
+]
+
+
+def _import_pycaret():
+    import pycaret.regression  # noqa: F401
+
+
+def pycaret_loader(path):
+    """Domyślny loader — model zapisany przez `pycaret.regression.save_model`."""
+    from pycaret.regression import load_model as pycaret_load_model
+    return pycaret_load_model(path, verbose=False)
+
+
+# Import biblioteki (setki MB) nie jest częścią rozmiaru modelu — wykonywany przed pomiarem RSS
+pycaret_loader.prepare = _import_pycaret
+
+
+@dataclass
+class ModelSpec:
+    name: str
+    path: str
+    race: str = DEFAULT_RACE
+    distance: str = DEFAULT_DISTANCE
+    variant: str = DEFAULT_VARIANT
+    weight: float = 1.0
+    size_mb: float | None = None
+
+    def file_size_mb(self) -> float:
+        """Rozmiar pliku .pkl — dolne oszacowanie rozmiaru modelu w pamięci."""
+        for candidate in (self.path, self.path + ".pkl"):
+            if os.path.isfile(candidate):
+                return os.path.getsize(candidate) / (1024 * 1024)
+        return 0.0
+
+
+class ModelRegistry:
+    """Leniwie ładowane modele z limitem pamięci i wyborem po biegu/dystansie/wariancie."""
+
+    def __init__(self, specs=None, max_memory_mb=DEFAULT_MAX_MEMORY_MB, loader=pycaret_loader):
+        self.max_memory_mb = max_memory_mb
+        self.loader = loader
+        self._specs: dict[str, ModelSpec] = {}
+        self._loaded: OrderedDict[str, object] = OrderedDict()
+        self._sizes: dict[str, float] = {}
+        self._measured_mb: dict[str, float] = {}
+        self._lock = threading.Lock()
+        # Ładowania są szeregowane: pomiar przyrostu RSS jednego modelu nie może
+        # obejmować innego ładowanego równolegle. Dostęp do już załadowanych modeli
+        # nie czeka na tę blokadę.
+        self._load_lock = threading.Lock()
+        self.stats = {"hits": 0, "loads": 0, "evictions": 0, "oversized": 0}
+        for spec in specs or []:
+            self.register(spec)
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_REGISTRY_FILE, **kwargs):
+        """Rejestr z pliku JSON; bez pliku — tylko domyślny model aplikacji."""
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                entries = json.load(f).get("models", [])
+        else:
+            entries = DEFAULT_MODELS
+        return cls([ModelSpec(**entry) for entry in entries], **kwargs)
+
+    def register(self, spec: ModelSpec):
+        with self._lock:
+            if spec.name in self._specs:
+                raise ValueError(f"Model '{spec.name}' jest już zarejestrowany")
+            self._specs[spec.name] = spec
+
+    def specs(self):
+        return list(self._specs.values())
+
+    def loaded_models(self):
+        """Nazwy załadowanych modeli, od najdawniej do ostatnio używanego."""
+        with self._lock:
+            return list(self._loaded)
+
+    def memory_used_mb(self) -> float:
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def route(self, race=DEFAULT_RACE, distance=DEFAULT_DISTANCE, variant=None, routing_key=None) -> ModelSpec:
+        """
+        Wybierz model dla biegu i dystansu. Jeśli nie podano wariantu, a jest ich kilka,
+        wybór jest deterministyczny względem `routing_key` (np. id sesji) i wag wariantów.
+        """
+        candidates = [s for s in self._specs.values() if s.race == race and s.distance == distance]
+        if variant is not None:
+            candidates = [s for s in candidates if s.variant == variant]
+        if not candidates:
+            raise KeyError(f"Brak modelu dla race={race}, distance={distance}, variant={variant}")
+        if len(candidates) == 1:
+            return candidates[0]
+
+        if routing_key is None:
+            defaults = [s for s in candidates if s.variant == DEFAULT_VARIANT]
+            return defaults[0] if defaults else candidates[0]
+
+        candidates.sort(key=lambda s: s.name)
+        total = sum(max(s.weight, 0.0) for s in candidates) or 1.0
+        digest = hashlib.sha256(str(routing_key).encode("utf-8")).digest()
+        point = int.from_bytes(digest[:8], "big") / 2 ** 64 * total
+        for spec in candidates:
+            point -= max(spec.weight, 0.0)
+            if point < 0:
+                return spec
+        return candidates[-1]
+
+    def size_hint_mb(self, name: str) -> float:
+        """Rozmiar modelu przed ładowaniem: podany w registry.json, zmierzony wcześniej lub rozmiar pliku."""
+        spec = self._specs[name]
+        if spec.size_mb is not None:
+            return float(spec.size_mb)
+        return self._measured_mb.get(name, spec.file_size_mb())
+
+    def _load_measured(self, spec: ModelSpec):
+        """Załaduj model i zmierz jego rozmiar jako przyrost RSS (wywoływać pod self._load_lock)."""
+        prepare = getattr(self.loader, "prepare", None)
+        if prepare is not None:
+            prepare()
+        rss_before = get_rss_mb()
+        model = self.loader(spec.path)
+        rss_after = get_rss_mb()
+        if spec.size_mb is not None:
+            return model, float(spec.size_mb)
+        size = spec.file_size_mb()
+        if rss_before is not None and rss_after is not None:
+            size = max(rss_after - rss_before, size)
+        # Ponowne ładowanie po usunięciu może trafić w pamięć już przydzieloną procesowi
+        # (przyrost RSS bliski zeru) — mniejszy pomiar nie zastępuje większego
+        size = max(self._measured_mb.get(spec.name, 0.0), size)
+        self._measured_mb[spec.name] = size
+        return model, size
+
+    def get(self, name: str):
+        """Zwróć model po nazwie, ładując go przy pierwszym użyciu."""
+        with self._lock:
+            if name in self._loaded:
+                self._loaded.move_to_end(name)
+                self.stats["hits"] += 1
+                return self._loaded[name]
+            if name not in self._specs:
+                raise KeyError(f"Nieznany model: {name}")
+            spec = self._specs[name]
+
+        with self._load_lock:
+            # Inna sesja mogła załadować ten model, gdy czekaliśmy na blokadę
+            with self._lock:
+                if name in self._loaded:
+                    self._loaded.move_to_end(name)
+                    self.stats["hits"] += 1
+                    return self._loaded[name]
+                # Zwolnij miejsce przed ładowaniem, żeby szczyt pamięci nie przekroczył limitu
+                evicted = self._evict_for(self.size_hint_mb(name))
+            if evicted:
+                gc.collect()
+            model, size = self._load_measured(spec)
+            if size > self.max_memory_mb:
+                self.stats["oversized"] += 1
+                print(
+                    f"⚠️ Model '{name}' zajmuje {size:.1f} MB, więcej niż limit {self.max_memory_mb:.1f} MB "
+                    f"— zostanie załadowany sam, limit pamięci jest przekroczony"
+                )
+            with self._lock:
+                evicted = self._evict_for(size)
+                self._loaded[name] = model
+                self._sizes[name] = size
+                self.stats["loads"] += 1
+            if evicted:
+                gc.collect()
+            return model
+
+    def get_for(self, race=DEFAULT_RACE, distance=DEFAULT_DISTANCE, variant=None, routing_key=None):
+        """Wybierz model przez `route()` i zwróć (spec, model)."""
+        spec = self.route(race, distance, variant, routing_key)
+        return spec, self.get(spec.name)
+
+    def unload(self, name: str):
+        with self._lock:
+            self._loaded.pop(name, None)
+            self._sizes.pop(name, None)
+
+    def _evict_for(self, incoming_mb: float) -> int:
+        """Usuń najdawniej używane modele, aż zmieści się nowy (wywoływać pod self._lock)."""
+        evicted = 0
+        while self._loaded and sum(self._sizes.values()) + incoming_mb > self.max_memory_mb:
+            name, _ = self._loaded.popitem(last=False)
+            self._sizes.pop(name, None)
+            self.stats["evictions"] += 1
+            evicted += 1
+        return evicted
@@ -0,0 +1,428 @@
+"""
+HTTP API (JSON) do predykcji czasu półmaratonu z dynamicznym micro-batchingiem.
+
+Żądania trafiają do kolejki, a wątek roboczy grupuje je w paczki (do
+`max_batch_size` sztuk lub `max_wait_ms` od pierwszego żądania) i wykonuje
+jedno wektorowe wywołanie modelu. Pełna kolejka = odpowiedź 503 (backpressure).
+
+Każda instancja może wskazać model polami opcjonalnymi `race`, `distance`,
+`variant` i `routing_key` (wybór jak w `ModelRegistry.route`). Paczka jest
+dzielona według modelu, a każda predykcja zwraca `model_name` i `model_variant`.
+
+Endpointy:
+    POST /predict  {"gender": "M", "age": 35, "time_5k_minutes": 25.0}
+                   {"gender": "K", "age": 40, "time_5k_minutes": 28.0, "routing_key": "sesja-42"}
+                   lub {"instances": [{...}, {...}]}
+    GET  /stats    przepustowość, rozmiary paczek, percentyle opóźnień
+    GET  /health
+
+Uruchomienie lokalne (bez PyCaret — prosty wzór Riegela zamiast modelu):
+    python prediction_api.py --port 8000 --fake-model
+"""
+import argparse
+import json
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Empty, Queue
+
+from helpers import format_time, percentile
+from model_registry import ModelRegistry, ModelSpec, DEFAULT_RACE, DEFAULT_DISTANCE, DEFAULT_VARIANT
+
+MAX_INSTANCES_PER_REQUEST = 64
+MAX_BODY_BYTES = 64 * 1024
+MAX_AGE = 120
+MAX_TIME_5K_MINUTES = 180
+
+
+class QueueFullError(Exception):
+    """Kolejka micro-batchera jest pełna — klient powinien ponowić żądanie później."""
+
+
+def _parse_number(payload, field):
+    """Skończona liczba z pola JSON (odrzuca bool, NaN, inf i napisy typu "nan")."""
+    value = payload.get(field)
+    if isinstance(value, bool):
+        raise ValueError(f'Pole "{field}" musi być liczbą')
+    try:
+        number = float(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f'Pole "{field}" musi być liczbą')
+    if not math.isfinite(number):
+        raise ValueError(f'Pole "{field}" musi być skończoną liczbą')
+    return number
+
+
+def _parse_optional_str(payload, field, default=None):
+    value = payload.get(field)
+    if value is None:
+        return default
+    if field == "routing_key" and isinstance(value, int) and not isinstance(value, bool):
+        # Liczbowe id sesji/użytkownika trafia do tego samego wariantu co jego zapis tekstowy
+        value = str(value)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f'Pole "{field}" musi być niepustym napisem')
+    return value.strip()
+
+
+def parse_instance(payload):
+    """
+    Walidacja pojedynczego żądania; zwraca (gender, age, time_5k_seconds, route),
+    gdzie route = (race, distance, variant, routing_key) — argumenty `ModelRegistry.route`.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("Każda instancja musi być obiektem JSON")
+    gender = str(payload.get("gender") or "").strip().upper()
+    if gender not in ("M", "K"):
+        raise ValueError('Pole "gender" musi mieć wartość "M" lub "K"')
+    age = _parse_number(payload, "age")
+    time_5k = _parse_number(payload, "time_5k_minutes")
+    if not 0 < age < MAX_AGE:
+        raise ValueError(f'Pole "age" musi być w zakresie (0, {MAX_AGE})')
+    if not 0 < time_5k <= MAX_TIME_5K_MINUTES:
+        raise ValueError(f'Pole "time_5k_minutes" musi być w zakresie (0, {MAX_TIME_5K_MINUTES}]')
+    route = (
+        _parse_optional_str(payload, "race", DEFAULT_RACE),
+        _parse_optional_str(payload, "distance", DEFAULT_DISTANCE),
+        _parse_optional_str(payload, "variant"),
+        _parse_optional_str(payload, "routing_key"),
+    )
+    return gender, age, time_5k * 60, route
+
+
+def make_pycaret_predict_fn(registry):
+    """
+    Wektorowa predykcja paczki przez model PyCaret z rejestru (jedno wywołanie predict_model).
+    Instancje mają postać (gender, age, time_5k_seconds, spec) i w jednej paczce wskazują ten sam model.
+    """
+    import pandas as pd
+    from pycaret.regression import predict_model as pycaret_predict_model
+
+    def predict_batch(instances):
+        model = registry.get(instances[0][3].name)
+        current_year = datetime.now().year
+        # Te same cechy co w predict_half_marathon_time() w app.py
+        input_data = pd.DataFrame([{
+            'Średni Czas na 5 km': time_5k,
+            'Rocznik': current_year - age,
+            'Płeć_LE': 1 if gender == 'M' else 0,
+        } for gender, age, time_5k, _spec in instances])
+        prediction_df = pycaret_predict_model(model, data=input_data, verbose=False)
+        return prediction_df['prediction_label'].astype(float).tolist()
+
+    # Wybór modelu dla trasy z żądania (KeyError = brak modelu, odpowiedź 400)
+    predict_batch.resolve = registry.route
+    return predict_batch
+
+
+RIEGEL_SPEC = ModelSpec(name="riegel", path="", variant=DEFAULT_VARIANT)
+
+
+def riegel_predict_fn(instances):
+    """Model zastępczy do testów lokalnych: wzór Riegela T2 = T1 * (D2/D1)^1.06."""
+    return [time_5k * (21.0975 / 5) ** 1.06 for _gender, _age, time_5k, _spec in instances]
+
+
+def _resolve_riegel(race=DEFAULT_RACE, distance=DEFAULT_DISTANCE, variant=None, routing_key=None):
+    if distance != DEFAULT_DISTANCE:
+        raise KeyError(f"Brak modelu dla race={race}, distance={distance}, variant={variant}")
+    return RIEGEL_SPEC
+
+
+riegel_predict_fn.resolve = _resolve_riegel
+
+
+class MicroBatcher:
+    """
+    Kolejka żądań grupowanych w paczki dla jednego wektorowego wywołania modelu.
+    Z `group_key` paczka jest dzielona na grupy (np. według modelu) i każda grupa
+    to osobne wywołanie `predict_fn` — błąd jednej grupy nie dotyczy pozostałych.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=5.0, max_queue_size=1024,
+                 stats_window=10000, group_key=None):
+        self.predict_fn = predict_fn
+        self.group_key = group_key
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000
+        self._queue: Queue = Queue(maxsize=max_queue_size)
+        self._submit_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=stats_window)
+        self._batch_sizes = deque(maxlen=stats_window)
+        self._counters = {"requests": 0, "completed": 0, "failed": 0, "rejected": 0, "batches": 0}
+        self._started_at = time.monotonic()
+
+    def start(self):
+        self._started_at = time.monotonic()
+        self._worker.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._worker.join(timeout)
+
+    def submit(self, instance) -> Future:
+        """Dodaj żądanie do kolejki; przy pełnej kolejce rzuca QueueFullError."""
+        return self.submit_many([instance])[0]
+
+    def submit_many(self, instances) -> list:
+        """
+        Dodaj wszystkie instancje albo żadnej: gdy kolejka nie zmieści całego żądania,
+        rzuca QueueFullError i nic nie trafia do modelu.
+        """
+        now = time.perf_counter()
+        futures = [Future() for _ in instances]
+        # Kolejkę zapełniają tylko wywołania submit_many (pod tą blokadą), a wątek roboczy
+        # tylko ją opróżnia — sprawdzone wolne miejsce nie może zniknąć przed put_nowait
+        with self._submit_lock:
+            maxsize = self._queue.maxsize
+            if maxsize > 0 and self._queue.qsize() + len(instances) > maxsize:
+                with self._stats_lock:
+                    self._counters["rejected"] += len(instances)
+                raise QueueFullError("Serwer jest przeciążony, spróbuj ponownie później")
+            for instance, future in zip(instances, futures):
+                self._queue.put_nowait((instance, future, now))
+        with self._stats_lock:
+            self._counters["requests"] += len(instances)
+        return futures
+
+    def _collect_batch(self):
+        try:
+            first = self._queue.get(timeout=0.1)
+        except Empty:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Pomiń żądania anulowane przez klienta, zanim trafiły do modelu
+            batch = [item for item in self._collect_batch() if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            if self.group_key is None:
+                self._predict_batch(batch)
+                continue
+            groups = {}
+            for item in batch:
+                groups.setdefault(self.group_key(item[0]), []).append(item)
+            for group in groups.values():
+                self._predict_batch(group)
+
+    def _predict_batch(self, batch):
+        instances = [instance for instance, _future, _t in batch]
+        try:
+            results = self.predict_fn(instances)
+            if len(results) != len(batch):
+                raise RuntimeError("Model zwrócił inną liczbę wyników niż rozmiar paczki")
+        except Exception as e:
+            for _instance, future, _t in batch:
+                future.set_exception(e)
+            with self._stats_lock:
+                self._counters["failed"] += len(batch)
+                self._counters["batches"] += 1
+                self._batch_sizes.append(len(batch))
+            return
+
+        done = time.perf_counter()
+        for (_instance, future, enqueued), result in zip(batch, results):
+            future.set_result(result)
+        with self._stats_lock:
+            self._counters["completed"] += len(batch)
+            self._counters["batches"] += 1
+            self._batch_sizes.append(len(batch))
+            self._latencies.extend(done - enqueued for _i, _f, enqueued in batch)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            counters = dict(self._counters)
+            latencies_ms = [lat * 1000 for lat in self._latencies]
+            batch_sizes = list(self._batch_sizes)
+        uptime = time.monotonic() - self._started_at
+        return {
+            **counters,
+            "queue_depth": self._queue.qsize(),
+            "uptime_s": round(uptime, 3),
+            "throughput_per_s": counters["completed"] / uptime if uptime else 0.0,
+            "avg_batch_size": sum(batch_sizes) / len(batch_sizes) if batch_sizes else None,
+            "max_batch_size_seen": max(batch_sizes) if batch_sizes else None,
+            "latency_ms": {
+                "p50": percentile(latencies_ms, 50),
+                "p95": percentile(latencies_ms, 95),
+                "p99": percentile(latencies_ms, 99),
+            },
+            "config": {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_s * 1000,
+                "max_queue_size": self._queue.maxsize,
+            },
+        }
+
+
+class PredictionRequestHandler(BaseHTTPRequestHandler):
+    server_version = "HalfMarathonPredictor/1.0"
+    request_timeout_s = 10.0
+
+    def _send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        if status == 503:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Bez logu każdego żądania — przy obciążeniu zaśmieca konsolę
+        pass
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/stats":
+            self._send_json(200, self.server.batcher.stats())
+        else:
+            self._send_json(404, {"error": "Nie znaleziono"})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self._send_json(404, {"error": "Nie znaleziono"})
+            return
+        try:
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                raise ValueError("Niepoprawny nagłówek Content-Length")
+            # rfile.read(-1) czekałby na zamknięcie połączenia przez klienta
+            if length < 0:
+                raise ValueError("Niepoprawny nagłówek Content-Length")
+            if length > MAX_BODY_BYTES:
+                self._send_json(413, {"error": f"Maksymalny rozmiar żądania to {MAX_BODY_BYTES} bajtów"})
+                return
+            payload = json.loads(self.rfile.read(length) or b"null")
+            is_list = isinstance(payload, dict) and "instances" in payload
+            raw_instances = payload["instances"] if is_list else [payload]
+            if not isinstance(raw_instances, list) or not raw_instances:
+                raise ValueError('Pole "instances" musi być niepustą listą')
+            if len(raw_instances) > MAX_INSTANCES_PER_REQUEST:
+                raise ValueError(f'Maksymalnie {MAX_INSTANCES_PER_REQUEST} instancji w jednym żądaniu')
+            instances = []
+            for item in raw_instances:
+                gender, age, time_5k, route = parse_instance(item)
+                # Trasa jest rozwiązywana przed kolejką: nieznany model to błąd klienta, nie 500
+                instances.append((gender, age, time_5k, self.server.resolve_model(*route)))
+        except KeyError as e:
+            self._send_json(400, {"error": e.args[0] if e.args else "Brak modelu"})
+            return
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        try:
+            futures = self.server.batcher.submit_many(instances)
+        except QueueFullError as e:
+            self._send_json(503, {"error": str(e)})
+            return
+
+        try:
+            predictions = [float(f.result(timeout=self.request_timeout_s)) for f in futures]
+            if not all(math.isfinite(p) and p >= 0 for p in predictions):
+                raise ValueError("model zwrócił niepoprawny wynik")
+            results = [
+                {
+                    "predicted_seconds": round(p, 1),
+                    "predicted_time": format_time(p),
+                    "model_name": spec.name,
+                    "model_variant": spec.variant,
+                }
+                for p, (_gender, _age, _time_5k, spec) in zip(predictions, instances)
+            ]
+        except Exception as e:
+            for f in futures:
+                f.cancel()
+            self._send_json(500, {"error": f"Błąd podczas predykcji: {e}"})
+            return
+
+        self._send_json(200, {"predictions": results} if is_list else results[0])
+
+
+class PredictionHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Domyślna kolejka połączeń (5) zrywa połączenia przy wielu równoległych klientach
+    request_queue_size = 256
+
+
+def create_server(predict_fn, host="127.0.0.1", port=8000, **batcher_kwargs):
+    """
+    Serwer HTTP z uruchomionym micro-batcherem (do zatrzymania: shutdown() + batcher.stop()).
+    `predict_fn.resolve(race, distance, variant, routing_key)` zwraca ModelSpec dla trasy z żądania.
+    """
+    server = PredictionHTTPServer((host, port), PredictionRequestHandler)
+    server.resolve_model = predict_fn.resolve
+    server.batcher = MicroBatcher(
+        predict_fn, group_key=lambda instance: instance[3].name, **batcher_kwargs
+    ).start()
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP API predykcji czasu półmaratonu")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0,
+                        help="Maksymalny czas oczekiwania na uzupełnienie paczki")
+    parser.add_argument("--max-queue-size", type=int, default=1024,
+                        help="Powyżej tej liczby oczekujących żądań serwer zwraca 503")
+    parser.add_argument("--fake-model", action="store_true",
+                        help="Zamiast modelu PyCaret użyj wzoru Riegela (testy lokalne)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.fake_model:
+        predict_fn = riegel_predict_fn
+    else:
+        registry = ModelRegistry.from_file()
+        predict_fn = make_pycaret_predict_fn(registry)
+        # Załaduj domyślny model przed przyjęciem pierwszego żądania; pozostałe przy pierwszym użyciu
+        registry.get_for()
+
+    server = create_server(
+        predict_fn,
+        host=args.host,
+        port=args.port,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        max_queue_size=args.max_queue_size,
+    )
+    print(f"✅ API nasłuchuje na http://{args.host}:{args.port} (POST /predict, GET /stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.batcher.stop()
+
+
+if __name__ == "__main__":
+    main()
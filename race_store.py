@@ -0,0 +1,179 @@
+"""
+Lokalny magazyn wyników biegów do trenowania modelu.
+
+Każdy rok (i bieg) jest wczytywany z CSV tylko raz, czyszczony tak jak
+w notebooku `zadanie_domowe9.ipynb` i zapisywany jako osobna partycja
+w formacie Arrow IPC (kolumnowy, typowany, bez kompresji), np.:
+
+    data/race_store/race=wroclaw_half/year=2023/part.arrow
+
+Czasy są już zamienione na sekundy (int32), a `Średni Czas na 5 km`
+jest policzony przy zapisie. Dodanie nowego roku/biegu nie przetwarza
+istniejących partycji, a widok treningowy jest ładowany przez
+memory-mapping plików.
+
+Przykład:
+    store = RaceStore()
+    store.ingest("s3://zadaniedomowe9/halfmarathon_wroclaw_2023__final.csv", year=2023)
+    store.ingest("s3://zadaniedomowe9/halfmarathon_wroclaw_2024__final.csv", year=2024)
+    merge_df = store.load_training_view()
+"""
+import json
+import os
+import tempfile
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+
+DEFAULT_STORE_DIR = os.path.join("data", "race_store")
+DEFAULT_RACE = "wroclaw_half"
+MANIFEST_FILE = "manifest.json"
+PARTITION_FILE = "part.arrow"
+
+SPLIT_TIME_COLUMNS = ['5 km Czas', '10 km Czas', '15 km Czas', '20 km Czas']
+TIME_COLUMNS = SPLIT_TIME_COLUMNS + ['Czas']
+TRAINING_COLUMNS = ['Płeć', 'Rocznik', 'Średni Czas na 5 km', 'Czas', 'Rok']
+
+PARTITION_SCHEMA = pa.schema([
+    ('Płeć', pa.dictionary(pa.int8(), pa.string())),
+    ('Rocznik', pa.int16()),
+    ('5 km Czas', pa.int32()),
+    ('10 km Czas', pa.int32()),
+    ('15 km Czas', pa.int32()),
+    ('20 km Czas', pa.int32()),
+    ('Czas', pa.int32()),
+    ('Średni Czas na 5 km', pa.float64()),
+    ('Rok', pa.int16()),
+])
+
+
+def times_to_seconds(series: pd.Series) -> pd.Series:
+    """Wektorowa zamiana 'HH:MM:SS' na sekundy; DNS/DNF/puste/błędny format -> <NA> (tylko w tym wierszu)."""
+    # Godziny maks. 2 cyfry, minuty i sekundy 0-59 — wartości spoza zakresu nie mogą przepełnić Int32
+    parts = series.astype("string").str.strip().str.extract(r'^(\d{1,2}):([0-5]?\d):([0-5]?\d)$')
+    h, m, s = (pd.to_numeric(parts[i]) for i in range(3))
+    return (h * 3600 + m * 60 + s).astype("Int32")
+
+
+def prepare_race_frame(raw_df: pd.DataFrame, year: int) -> pd.DataFrame:
+    """Czyszczenie jak w notebooku: usunięcie braków, czasy w sekundach, średni czas na 5 km."""
+    df = raw_df[['Płeć', 'Rocznik'] + TIME_COLUMNS].copy()
+    df = df.dropna(subset=['Płeć', 'Rocznik'] + TIME_COLUMNS)
+    for col in TIME_COLUMNS:
+        df[col] = times_to_seconds(df[col])
+    # Wiersze z DNS/DNF lub niepoprawnym formatem czasu nie nadają się do treningu
+    df = df.dropna(subset=TIME_COLUMNS)
+    df['Rocznik'] = pd.to_numeric(df['Rocznik'], errors='coerce')
+    df = df[df['Rocznik'] >= 1]
+    df['Rocznik'] = df['Rocznik'].astype('int16')
+
+    df['Średni Czas na 5 km'] = df[SPLIT_TIME_COLUMNS].sum(axis=1).astype('float64') / 10
+    df['Rok'] = pd.Series(year, index=df.index, dtype='int16')
+    return df[[field.name for field in PARTITION_SCHEMA]].reset_index(drop=True)
+
+
+class RaceStore:
+    """Magazyn wyników partycjonowany po biegu i roku (pliki Arrow IPC + manifest JSON)."""
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_FILE)
+
+    def _read_manifest(self) -> dict:
+        if not os.path.exists(self.manifest_path):
+            return {"partitions": {}}
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest: dict):
+        os.makedirs(self.root, exist_ok=True)
+        # Zapis atomowy — przerwany ingest nie psuje manifestu
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def _partition_key(race: str, year: int) -> str:
+        return f"race={race}/year={int(year)}"
+
+    def partition_path(self, race: str, year: int) -> str:
+        return os.path.join(self.root, f"race={race}", f"year={int(year)}", PARTITION_FILE)
+
+    def partitions(self) -> dict:
+        """Metadane zapisanych partycji (klucz 'race=.../year=...')."""
+        return self._read_manifest()["partitions"]
+
+    def has_partition(self, race: str, year: int) -> bool:
+        key = self._partition_key(race, year)
+        return key in self.partitions() and os.path.exists(self.partition_path(race, year))
+
+    def ingest(self, source, year: int, race: str = DEFAULT_RACE, sep: str = ';', force: bool = False) -> bool:
+        """
+        Wczytaj CSV (ścieżka lokalna lub s3://) jako partycję (race, year).
+        Jeśli partycja już istnieje, nic nie jest pobierane — chyba że force=True.
+        Zwraca True, jeśli partycja została zapisana; ValueError, gdy po czyszczeniu nie zostaje ani jeden wiersz.
+        """
+        if not force and self.has_partition(race, year):
+            return False
+
+        source_df = source if isinstance(source, pd.DataFrame) else pd.read_csv(source, sep=sep)
+        df = prepare_race_frame(source_df, year)
+        if df.empty:
+            # Pusta partycja w manifeście blokowałaby kolejne próby ingestu tego roku
+            raise ValueError(
+                f"Brak poprawnych wierszy dla race={race}, year={year} "
+                f"(wczytano {len(source_df)} wierszy) — partycja nie została zapisana"
+            )
+        table = pa.Table.from_pandas(df, schema=PARTITION_SCHEMA, preserve_index=False)
+
+        path = self.partition_path(race, year)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+
+        manifest = self._read_manifest()
+        manifest["partitions"][self._partition_key(race, year)] = {
+            "race": race,
+            "year": int(year),
+            "source": source if isinstance(source, str) else "<DataFrame>",
+            "rows": table.num_rows,
+            "ingested_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        self._write_manifest(manifest)
+        return True
+
+    def _selected_partitions(self, races=None, years=None):
+        selected = []
+        for meta in self.partitions().values():
+            if races is not None and meta["race"] not in races:
+                continue
+            if years is not None and meta["year"] not in years:
+                continue
+            selected.append(meta)
+        return sorted(selected, key=lambda m: (m["race"], m["year"]))
+
+    def load_table(self, races=None, years=None, columns=None) -> pa.Table:
+        """Połącz wybrane partycje w jedną tabelę Arrow (pliki są memory-mapowane)."""
+        tables = []
+        for meta in self._selected_partitions(races, years):
+            source = pa.memory_map(self.partition_path(meta["race"], meta["year"]), "r")
+            table = pa.ipc.open_file(source).read_all()
+            tables.append(table.select(columns) if columns else table)
+        if not tables:
+            schema = PARTITION_SCHEMA
+            if columns:
+                schema = pa.schema([PARTITION_SCHEMA.field(c) for c in columns])
+            return schema.empty_table()
+        return pa.concat_tables(tables)
+
+    def load_training_view(self, races=None, years=None) -> pd.DataFrame:
+        """Widok treningowy taki jak `merge_df` w notebooku po przetworzeniu."""
+        table = self.load_table(races, years, columns=TRAINING_COLUMNS)
+        df = table.to_pandas()
+        df['Płeć'] = df['Płeć'].astype(str)
+        return df
@@ -0,0 +1,159 @@
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+from model_registry import ModelRegistry, ModelSpec
+
+
+class CountingLoader:
+    def __init__(self, delay_s=0.0):
+        self.delay_s = delay_s
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, path):
+        with self._lock:
+            self.calls[path] += 1
+        if self.delay_s:
+            time.sleep(self.delay_s)
+        return {"path": path}
+
+
+def make_registry(max_memory_mb=100, loader=None, **spec_overrides):
+    specs = [
+        ModelSpec(**{"name": name, "path": f"model/{name}", "size_mb": 40, **spec_overrides.get(name, {})})
+        for name in ("a", "b", "c")
+    ]
+    return ModelRegistry(specs, max_memory_mb=max_memory_mb, loader=loader or CountingLoader())
+
+
+def test_models_are_loaded_lazily_and_cached():
+    loader = CountingLoader()
+    registry = make_registry(loader=loader)
+    assert registry.loaded_models() == []
+
+    assert registry.get("a") is registry.get("a")
+
+    assert loader.calls == {"model/a": 1}
+    assert registry.stats["hits"] == 1
+
+
+def test_lru_eviction_respects_memory_cap():
+    loader = CountingLoader()
+    registry = make_registry(max_memory_mb=100, loader=loader)
+    registry.get("a")
+    registry.get("b")
+    registry.get("a")  # "b" jest teraz najdawniej używany
+
+    registry.get("c")
+
+    assert registry.loaded_models() == ["a", "c"]
+    assert registry.memory_used_mb() == 80
+    assert registry.stats["evictions"] == 1
+    registry.get("b")
+    assert loader.calls["model/b"] == 2
+
+
+def test_measured_size_is_used_when_size_not_declared(monkeypatch):
+    rss = iter([100.0, 130.0])
+    monkeypatch.setattr("model_registry.get_rss_mb", lambda: next(rss))
+    registry = ModelRegistry([ModelSpec(name="a", path="model/missing")], loader=CountingLoader())
+
+    registry.get("a")
+
+    assert registry.memory_used_mb() == 30.0
+    assert registry.size_hint_mb("a") == 30.0
+
+
+def test_smaller_measurement_on_reload_keeps_larger_size(monkeypatch):
+    # Pierwsze ładowanie: +30 MB; ponowne po usunięciu trafia w już przydzieloną pamięć: +1 MB
+    rss = iter([100.0, 130.0, 130.0, 131.0])
+    monkeypatch.setattr("model_registry.get_rss_mb", lambda: next(rss))
+    registry = ModelRegistry([ModelSpec(name="a", path="model/missing")], loader=CountingLoader())
+
+    registry.get("a")
+    registry.unload("a")
+    registry.get("a")
+
+    assert registry.memory_used_mb() == 30.0
+    assert registry.size_hint_mb("a") == 30.0
+
+
+def test_model_larger_than_cap_is_loaded_alone_with_warning(capsys):
+    registry = make_registry(max_memory_mb=100, c={"size_mb": 150})
+    registry.get("a")
+    registry.get("b")
+
+    assert registry.get("c") == {"path": "model/c"}
+
+    assert registry.loaded_models() == ["c"]
+    assert registry.stats["oversized"] == 1
+    assert "więcej niż limit" in capsys.readouterr().out
+
+
+def test_concurrent_first_use_loads_model_once():
+    loader = CountingLoader(delay_s=0.05)
+    registry = make_registry(loader=loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("a"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert loader.calls == {"model/a": 1}
+    assert all(r is results[0] for r in results)
+
+
+def test_loaded_model_is_served_while_another_is_loading():
+    loader = CountingLoader()
+    registry = make_registry(loader=loader)
+    registry.get("a")
+    release = threading.Event()
+    slow_loader_started = threading.Event()
+
+    def slow_loader(path):
+        slow_loader_started.set()
+        release.wait(5)
+        return {"path": path}
+
+    registry.loader = slow_loader
+    t = threading.Thread(target=registry.get, args=("b",))
+    t.start()
+    slow_loader_started.wait(5)
+
+    started = time.perf_counter()
+    assert registry.get("a") == {"path": "model/a"}
+    assert time.perf_counter() - started < 1
+
+    release.set()
+    t.join()
+
+
+def test_route_by_race_distance_and_variant():
+    registry = ModelRegistry([
+        ModelSpec(name="half", path="p1"),
+        ModelSpec(name="half_b", path="p2", variant="B"),
+        ModelSpec(name="marathon", path="p3", distance="marathon"),
+    ], loader=CountingLoader())
+
+    assert registry.route(distance="marathon").name == "marathon"
+    assert registry.route(variant="B").name == "half_b"
+    assert registry.route().name == "half"
+    with pytest.raises(KeyError):
+        registry.route(race="krakow_half")
+
+
+def test_weighted_routing_is_deterministic_and_follows_weights():
+    registry = ModelRegistry([
+        ModelSpec(name="control", path="p1", weight=0.9),
+        ModelSpec(name="candidate", path="p2", variant="B", weight=0.1),
+    ], loader=CountingLoader())
+
+    assigned = Counter(registry.route(routing_key=f"session-{i}").name for i in range(10000))
+
+    assert registry.route(routing_key="session-42").name == registry.route(routing_key="session-42").name
+    assert 800 < assigned["candidate"] < 1200
+    assert assigned["control"] + assigned["candidate"] == 10000
@@ -0,0 +1,276 @@
+import http.client
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from helpers import format_time
+from model_registry import ModelRegistry, ModelSpec
+from prediction_api import MicroBatcher, QueueFullError, RIEGEL_SPEC, create_server, riegel_predict_fn
+
+VALID = {"gender": "M", "age": 35, "time_5k_minutes": 25}
+
+
+class RecordingPredictFn:
+    """Zapisuje paczki; opcjonalnie czeka na `release`, zanim odpowie."""
+
+    def __init__(self, block=False, result=1000.0):
+        self.batches = []
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.block = block
+        self.result = result
+        self.resolve = riegel_predict_fn.resolve
+
+    def __call__(self, instances):
+        self.batches.append(list(instances))
+        self.started.set()
+        if self.block:
+            self.release.wait(5)
+        return [self.result] * len(instances)
+
+
+class RegistryPredictFn(RecordingPredictFn):
+    """Wynik zależy od modelu wybranego przez rejestr — jak make_pycaret_predict_fn bez PyCaret."""
+
+    def __init__(self, registry, results):
+        super().__init__()
+        self.resolve = registry.route
+        self.results = results
+
+    def __call__(self, instances):
+        self.batches.append(list(instances))
+        return [self.results[spec.name] for _gender, _age, _time_5k, spec in instances]
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def _serve(predict_fn=riegel_predict_fn, **batcher_kwargs):
+        server = create_server(predict_fn, port=0, **batcher_kwargs)
+        threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield _serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+        server.batcher.stop()
+
+
+def post(base_url, body, raw=None):
+    data = raw if raw is not None else json.dumps(body).encode("utf-8")
+    request = urllib.request.Request(f"{base_url}/predict", data=data, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def get(base_url, path):
+    with urllib.request.urlopen(f"{base_url}{path}", timeout=5) as response:
+        return json.load(response)
+
+
+def test_single_and_multi_instance_predictions(serve):
+    url = serve()
+    expected = riegel_predict_fn([("M", 35, 25 * 60, RIEGEL_SPEC)])[0]
+
+    status, body = post(url, VALID)
+    assert status == 200
+    assert body == {
+        "predicted_seconds": round(expected, 1),
+        "predicted_time": format_time(expected),
+        "model_name": "riegel",
+        "model_variant": "default",
+    }
+
+    status, body = post(url, {"instances": [VALID, {**VALID, "gender": "k"}]})
+    assert status == 200
+    assert len(body["predictions"]) == 2
+
+
+@pytest.mark.parametrize("payload", [
+    {**VALID, "gender": "X"},
+    {**VALID, "age": None},
+    {**VALID, "age": True},
+    {**VALID, "age": 150},
+    {**VALID, "time_5k_minutes": "inf"},
+    {**VALID, "time_5k_minutes": "nan"},
+    {**VALID, "time_5k_minutes": 1e308},
+    {**VALID, "time_5k_minutes": 0},
+    {**VALID, "age": 10 ** 400},
+    {**VALID, "race": 5},
+    {**VALID, "variant": ""},
+    {**VALID, "distance": "marathon"},
+    {"instances": []},
+    {"instances": [VALID] * 65},
+    [VALID],
+])
+def test_invalid_input_returns_400(serve, payload):
+    url = serve()
+    status, body = post(url, payload)
+    assert status == 400
+    assert "error" in body
+
+
+def test_json_nan_literal_returns_400(serve):
+    url = serve()
+    status, _body = post(url, None, raw=b'{"gender": "M", "age": 35, "time_5k_minutes": NaN}')
+    assert status == 400
+
+
+def test_oversized_body_returns_413(serve):
+    url = serve()
+    status, _body = post(url, None, raw=b" " * (64 * 1024 + 1))
+    assert status == 413
+
+
+@pytest.mark.parametrize("content_length", ["-1", "abc"])
+def test_invalid_content_length_returns_400(serve, content_length):
+    url = serve()
+    conn = http.client.HTTPConnection(url.removeprefix("http://"), timeout=5)
+    try:
+        conn.putrequest("POST", "/predict")
+        conn.putheader("Content-Length", content_length)
+        conn.endheaders()
+        response = conn.getresponse()
+        assert response.status == 400
+        assert "error" in json.load(response)
+    finally:
+        conn.close()
+
+
+def test_instances_are_routed_and_batched_per_model(serve):
+    registry = ModelRegistry([
+        ModelSpec(name="half", path="p1"),
+        ModelSpec(name="half_b", path="p2", variant="B"),
+        ModelSpec(name="marathon", path="p3", distance="marathon"),
+    ], loader=lambda path: path)
+    predict_fn = RegistryPredictFn(registry, {"half": 6000.0, "half_b": 6100.0, "marathon": 12000.0})
+    url = serve(predict_fn, max_wait_ms=50)
+
+    status, body = post(url, {"instances": [
+        VALID,
+        {**VALID, "distance": "marathon"},
+        {**VALID, "variant": "B"},
+        {**VALID, "age": 40},
+    ]})
+
+    assert status == 200
+    assert [(p["model_name"], p["model_variant"], p["predicted_seconds"]) for p in body["predictions"]] == [
+        ("half", "default", 6000.0),
+        ("marathon", "default", 12000.0),
+        ("half_b", "B", 6100.0),
+        ("half", "default", 6000.0),
+    ]
+    # Jedno wywołanie modelu na model, każda paczka zawiera instancje tylko jednego modelu
+    assert sorted(len(b) for b in predict_fn.batches) == [1, 1, 2]
+    assert all(len({spec.name for *_rest, spec in b}) == 1 for b in predict_fn.batches)
+
+    status, body = post(url, {**VALID, "race": "krakow_half"})
+    assert status == 400
+
+
+def test_routing_key_selects_the_same_variant_as_registry(serve):
+    registry = ModelRegistry([
+        ModelSpec(name="control", path="p1", weight=0.5),
+        ModelSpec(name="candidate", path="p2", variant="B", weight=0.5),
+    ], loader=lambda path: path)
+    url = serve(RegistryPredictFn(registry, {"control": 6000.0, "candidate": 6100.0}))
+
+    for key in ("sesja-1", "sesja-2", "sesja-3", "sesja-4"):
+        _status, body = post(url, {**VALID, "routing_key": key})
+        assert body["model_name"] == registry.route(routing_key=key).name
+
+
+@pytest.mark.parametrize("result", [float("nan"), float("inf"), -1.0])
+def test_bad_model_output_returns_500(serve, result):
+    url = serve(RecordingPredictFn(result=result))
+    status, body = post(url, VALID)
+    assert status == 500
+    assert "error" in body
+    # Serwer i wątek roboczy nadal działają
+    assert get(url, "/health") == {"status": "ok"}
+
+
+def test_model_exception_returns_500(serve):
+    def failing(_instances):
+        raise RuntimeError("boom")
+
+    failing.resolve = riegel_predict_fn.resolve
+
+    url = serve(failing)
+    status, body = post(url, VALID)
+    assert status == 500
+    assert "boom" in body["error"]
+    assert get(url, "/stats")["failed"] == 1
+
+
+def test_partial_request_is_not_queued_when_queue_is_full(serve):
+    predict_fn = RecordingPredictFn(block=True)
+    url = serve(predict_fn, max_queue_size=4, max_batch_size=1)
+    first = threading.Thread(target=post, args=(url, VALID))
+    first.start()
+    assert predict_fn.started.wait(5)
+
+    status, _body = post(url, {"instances": [VALID] * 10})
+    predict_fn.release.set()
+    first.join(5)
+
+    assert status == 503
+    stats = get(url, "/stats")
+    assert stats["completed"] == 1
+    assert stats["rejected"] == 10
+    assert sum(len(b) for b in predict_fn.batches) == 1
+
+
+def test_batches_are_capped_at_max_batch_size():
+    predict_fn = RecordingPredictFn()
+    batcher = MicroBatcher(predict_fn, max_batch_size=4, max_wait_ms=200)
+    futures = batcher.submit_many([("M", 30, 1500)] * 10)
+    batcher.start()
+    try:
+        assert [f.result(timeout=5) for f in futures] == [1000.0] * 10
+    finally:
+        batcher.stop()
+    assert [len(b) for b in predict_fn.batches] == [4, 4, 2]
+    assert batcher.stats()["max_batch_size_seen"] == 4
+
+
+def test_partial_batch_waits_at_most_max_wait():
+    batcher = MicroBatcher(RecordingPredictFn(), max_batch_size=32, max_wait_ms=50).start()
+    try:
+        started = time.perf_counter()
+        batcher.submit(("M", 30, 1500)).result(timeout=5)
+        elapsed = time.perf_counter() - started
+    finally:
+        batcher.stop()
+    assert 0.04 <= elapsed < 1.0
+
+
+def test_submit_many_is_all_or_nothing():
+    batcher = MicroBatcher(RecordingPredictFn(), max_queue_size=4)
+    batcher.submit_many([("M", 30, 1500)] * 3)
+    with pytest.raises(QueueFullError):
+        batcher.submit_many([("M", 30, 1500)] * 2)
+    assert batcher.stats()["queue_depth"] == 3
+
+
+def test_cancelled_requests_are_skipped():
+    predict_fn = RecordingPredictFn()
+    batcher = MicroBatcher(predict_fn, max_batch_size=8, max_wait_ms=1)
+    kept, cancelled = batcher.submit_many([("M", 30, 1500), ("K", 30, 1600)])
+    cancelled.cancel()
+    batcher.start()
+    try:
+        assert kept.result(timeout=5) == 1000.0
+    finally:
+        batcher.stop()
+    assert predict_fn.batches == [[("M", 30, 1500)]]
@@ -0,0 +1,68 @@
+import pandas as pd
+import pytest
+
+from race_store import RaceStore, TRAINING_COLUMNS, times_to_seconds
+
+
+def make_raw(n=4, year_offset=0):
+    return pd.DataFrame({
+        'Płeć': ['M', 'K'] * (n // 2),
+        'Rocznik': [1980 + i + year_offset for i in range(n)],
+        '5 km Czas': ['00:25:00'] * n,
+        '10 km Czas': ['00:50:00'] * n,
+        '15 km Czas': ['01:15:00'] * n,
+        '20 km Czas': ['01:40:00'] * n,
+        'Czas': ['01:45:30'] * n,
+    })
+
+
+def test_times_to_seconds_marks_only_malformed_rows():
+    series = pd.Series(['01:02:03', '1:02:03:04', 'DNF', '', '00:25:00',
+                        '999999:00:00', '00:99:99', '00:60:00', '00:00:60', '1:05:09'])
+    result = times_to_seconds(series)
+    assert result.tolist()[0] == 3723
+    assert result.tolist()[4] == 1500
+    assert result.tolist()[9] == 3909
+    assert result.isna().tolist() == [False, True, True, True, False, True, True, True, True, False]
+    assert (result.dropna() >= 0).all()
+
+
+def test_ingest_drops_malformed_rows_and_keeps_the_rest(tmp_path):
+    raw = make_raw(1000)
+    raw.loc[3, 'Czas'] = '1:02:03:04'
+    store = RaceStore(str(tmp_path))
+
+    assert store.ingest(raw, year=2023) is True
+
+    assert store.partitions()['race=wroclaw_half/year=2023']['rows'] == 999
+    df = store.load_training_view()
+    assert list(df.columns) == TRAINING_COLUMNS
+    assert len(df) == 999
+    assert df['Czas'].iloc[0] == 6330
+    assert df['Średni Czas na 5 km'].iloc[0] == (1500 + 3000 + 4500 + 6000) / 10
+
+
+def test_ingest_refuses_empty_partition(tmp_path):
+    raw = make_raw()
+    raw['Czas'] = 'DNF'
+    store = RaceStore(str(tmp_path))
+
+    with pytest.raises(ValueError):
+        store.ingest(raw, year=2023)
+
+    assert store.partitions() == {}
+    assert store.ingest(make_raw(), year=2023) is True
+
+
+def test_append_year_without_reprocessing(tmp_path):
+    store = RaceStore(str(tmp_path))
+    store.ingest(make_raw(), year=2023)
+    first_ingest = store.partitions()['race=wroclaw_half/year=2023']['ingested_at']
+
+    assert store.ingest(make_raw(), year=2023) is False
+    assert store.ingest(make_raw(6), year=2024) is True
+
+    assert store.partitions()['race=wroclaw_half/year=2023']['ingested_at'] == first_ingest
+    df = store.load_training_view()
+    assert df.groupby('Rok').size().to_dict() == {2023: 4, 2024: 6}
+    assert len(store.load_training_view(years=[2024])) == 6